@@ -1,25 +1,154 @@
-import ast
+from __future__ import annotations
+
 import sys
 import os
-from typing import Any, Dict, Set
+import io
+from collections import OrderedDict
+
+# typing is only needed by type checkers: annotations are postponed and never evaluated at runtime
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Tuple
+
+# `ast` (and hashlib) are imported on first use so that early-exit CLI runs stay fast
+def _import_ast():
+    """Imports `ast` into the module globals and returns it. Called by every public entry point that touches nodes."""
+    global ast
+    if "ast" not in globals():
+        import ast
+    return ast
+
+def __getattr__(name: str):
+    """PEP 562 hook so that `pythonParser.ast` still resolves for importers."""
+    if name == "ast": return _import_ast()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Caching for recursively parsed files, keyed by (absolute path, content sha256, mode or None when imports are not resolved)
+PARSE_CACHE_MAX_ENTRIES = 256
+parse_cache: OrderedDict[Tuple[str, bytes, str | None], Dict[str, Any]] = OrderedDict()
+
+def _remember_parse(key: Tuple[str, bytes, str | None], definitions: Dict[str, Any]):
+    """Adds a parse result to the in-memory cache, evicting the least recently used entry."""
+    parse_cache[key] = definitions
+    parse_cache.move_to_end(key)
+    if len(parse_cache) > PARSE_CACHE_MAX_ENTRIES: parse_cache.popitem(last=False)
+
+# Files per directory, listed once per top-level parse_file call so import resolution needs no stat() per import
+dir_listing_cache: Dict[str, frozenset] = {}
+
+def _file_exists(path: str) -> bool:
+    """os.path.isfile() answered from a cached scandir() of the parent directory."""
+    directory, name = os.path.split(path)
+    listing = dir_listing_cache.get(directory)
+    if listing is None:
+        try:
+            with os.scandir(directory) as entries:
+                listing = frozenset(e.name for e in entries if e.is_file())
+        except OSError:
+            listing = frozenset()
+        dir_listing_cache[directory] = listing
+    return name in listing
+
+# Persistent cache of per-file definitions, shared across CLI invocations
+CACHE_DB_PATH = os.path.join(os.path.expanduser("~"), ".cache", "lata", "ast_cache.sqlite")
+# Bump whenever the shape or text of the cached definitions changes
+CACHE_VERSION = 1
+# Grammar every file is parsed with; parse results depend on it, so cache rows are keyed by it too
+PARSE_FEATURE_VERSION = sys.version_info[:2]
+CACHE_PYVER = "%d.%d" % PARSE_FEATURE_VERSION
+_cache_db = None
+
+def _open_cache_db():
+    """Opens (once) the on-disk AST cache. Returns None if it is unavailable."""
+    global _cache_db
+    if _cache_db is None:
+        import sqlite3
+        try:
+            os.makedirs(os.path.dirname(CACHE_DB_PATH), exist_ok=True)
+            _cache_db = sqlite3.connect(CACHE_DB_PATH)
+            # Several editor processes share the file; WAL lets readers proceed while one of them writes
+            _cache_db.execute("PRAGMA journal_mode=WAL")
+            if _cache_db.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+                _cache_db.execute("DROP TABLE IF EXISTS ast")
+                _cache_db.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+            _cache_db.execute("CREATE TABLE IF NOT EXISTS ast(path TEXT, sha BLOB, pyver TEXT, blob BLOB, PRIMARY KEY(path, sha, pyver))")
+        except (OSError, sqlite3.Error) as e:
+            print(f"AST cache disabled: {e}", file=sys.stderr)
+            _cache_db = False
+    return _cache_db or None
+
+def _load_cached_definitions(abs_filepath: str, sha: bytes) -> Dict[str, Any] | None:
+    """Returns the cached definitions for this exact file content, if any."""
+    db = _open_cache_db()
+    if db is None: return None
+    import pickle
+    try:
+        row = db.execute("SELECT blob FROM ast WHERE path = ? AND sha = ? AND pyver = ?", (abs_filepath, sha, CACHE_PYVER)).fetchone()
+        if not row: return None
+        definitions = pickle.loads(row[0])
+        definitions["functions"] = [FuncInfo._fromdict(f) for f in definitions["functions"]]
+        definitions["classes"] = [ClassInfo._fromdict(c) for c in definitions["classes"]]
+    except Exception:
+        return None
+    _index_definitions(definitions)
+    return definitions
+
+def _store_cached_definitions(abs_filepath: str, sha: bytes, definitions: Dict[str, Any]):
+    """
+    Stores the definitions of a file, before its imports are resolved, replacing any older content of that path.
+    Records are stored as plain dicts so the blob does not depend on whether this module ran as __main__.
+    """
+    db = _open_cache_db()
+    if db is None: return
+    import pickle
+    import sqlite3
+    definitions = {k: v for k, v in definitions.items() if not k.startswith('_')}
+    definitions["functions"] = [f._asdict() for f in definitions["functions"]]
+    definitions["classes"] = [c._asdict() for c in definitions["classes"]]
+    try:
+        with db:
+            # Only the latest content of a path is kept, so edited entry files do not grow the cache
+            db.execute("DELETE FROM ast WHERE path = ? AND pyver = ? AND sha <> ?", (abs_filepath, CACHE_PYVER, sha))
+            db.execute("INSERT OR REPLACE INTO ast(path, sha, pyver, blob) VALUES (?, ?, ?, ?)",
+                       (abs_filepath, sha, CACHE_PYVER, pickle.dumps(definitions, protocol=5)))
+    except sqlite3.Error as e:
+        print(f"Could not write AST cache: {e}", file=sys.stderr)
 
-# Caching for recursively parsed files
-parse_cache = {}
+def split_source_lines(content: str) -> List[str]:
+    """Splits source into lines the same way the parser numbers them (universal newlines only)."""
+    return io.StringIO(content, newline='').readlines()
 
-def get_node_repr(node: ast.AST) -> str:
+def _src(node: ast.AST, source_lines: List[str] | None) -> str:
+    """
+    Returns the source text of a node by slicing the original line it sits on.
+    Falls back to ast.unparse for multi-line or position-less nodes (e.g. ast.arguments).
+    """
+    lineno = getattr(node, "lineno", None)
+    if source_lines and lineno is not None and lineno == node.end_lineno and lineno <= len(source_lines):
+        line = source_lines[lineno - 1]
+        # Offsets are in UTF-8 bytes, which only match str indices for ASCII lines
+        if line.isascii(): return line[node.col_offset:node.end_col_offset]
+        return line.encode("utf-8")[node.col_offset:node.end_col_offset].decode("utf-8")
+    return ast.unparse(node)
+
+def get_node_repr(node: ast.AST, source_lines: List[str] | None = None) -> str:
     """
     Returns the code representation of a node as a string.
     - For literals (strings, numbers), it returns a string with quotes/etc. (e.g., 5 -> '5', "hi" -> "'hi'").
     - For variables and expressions, it returns the code as a string (e.g., res -> 'res', a + b -> 'a + b').
     """
+    _import_ast()
     if isinstance(node, ast.Constant):
         return repr(node.value)
-    # For everything else (variables, expressions, calls), ast.unparse is the best tool.
+    # For everything else (variables, expressions, calls), use the source text as written.
     try:
-        return ast.unparse(node)
+        return _src(node, source_lines)
     except Exception:
         return "'<Complex Value>'"
 
+# Node types ast.literal_eval can succeed on for our purposes; matched by name so `ast` can stay lazily imported
+_LITERAL_NODES = frozenset({"Constant", "Tuple", "List", "Set", "Dict", "UnaryOp"})
+
 def _get_literal_value(node: ast.AST) -> Any:
     """Tries to evaluate a node if it's a simple literal"""
     try:
@@ -27,46 +156,131 @@ def _get_literal_value(node: ast.AST) -> Any:
     except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
         return None
 
-def parse_function(node: ast.FunctionDef) -> Dict[str, Any]:
-    """Parses a FunctionDef node into a rich dictionary."""
+def _docstring(node: ast.FunctionDef | ast.ClassDef) -> str | None:
+    """Same as ast.get_docstring(node, clean=False), inlined."""
+    first = node.body[0] if node.body else None
+    if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+        return first.value.value
+    return None
+
+def _format_args(args: ast.arguments, source_lines: List[str] | None = None) -> str:
+    """Formats a signature's arguments like ast.unparse does, slicing annotations and defaults from source."""
+    def fmt(a: ast.arg, prefix: str = "") -> str:
+        return f"{prefix}{a.arg}: {_src(a.annotation, source_lines)}" if a.annotation else f"{prefix}{a.arg}"
+
+    parts = []
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + args.defaults
+    for index, (a, default) in enumerate(zip(positional, defaults), 1):
+        parts.append(f"{fmt(a)}={_src(default, source_lines)}" if default else fmt(a))
+        if index == len(args.posonlyargs): parts.append("/")
+    if args.vararg: parts.append(fmt(args.vararg, "*"))
+    elif args.kwonlyargs: parts.append("*")
+    for a, default in zip(args.kwonlyargs, args.kw_defaults):
+        parts.append(f"{fmt(a)}={_src(default, source_lines)}" if default else fmt(a))
+    if args.kwarg: parts.append(fmt(args.kwarg, "**"))
+    return ", ".join(parts)
+
+class FuncInfo:
+    """A parsed function or method."""
+    __slots__ = ("name", "args", "decorators", "returns_hint", "return_expression", "return_literal_obj",
+                 "docstring", "init_assignments")
+
+    def __init__(self, name: str, args: str, decorators: List[str], returns_hint: str | None, return_expression: str | None,
+                 return_literal_obj: Any, docstring: str | None, init_assignments: List[str]):
+        self.name = name
+        self.args = args
+        self.decorators = decorators
+        self.returns_hint = returns_hint
+        self.return_expression = return_expression
+        self.return_literal_obj = return_literal_obj
+        self.docstring = docstring
+        self.init_assignments = init_assignments
+
+    def _asdict(self) -> Dict[str, Any]:
+        return {"name": self.name, "args": self.args, "decorators": self.decorators, "returns_hint": self.returns_hint,
+                "return_expression": self.return_expression, "return_literal_obj": self.return_literal_obj,
+                "docstring": self.docstring, "init_assignments": self.init_assignments}
+
+    @classmethod
+    def _fromdict(cls, d: Dict[str, Any]) -> FuncInfo:
+        return cls(d["name"], d["args"], d["decorators"], d["returns_hint"], d["return_expression"], d["return_literal_obj"],
+                   d["docstring"], d["init_assignments"])
+
+def parse_function(node: ast.FunctionDef, source_lines: List[str] | None = None) -> FuncInfo:
+    """Parses a FunctionDef node into a FuncInfo."""
+    _import_ast()
     return_expression_str = None
     return_literal_obj = None
-    if node.body:
-        for item in reversed(node.body):
-            if isinstance(item, ast.Return) and item.value:
-                return_expression_str = get_node_repr(item.value)
-                return_literal_obj = _get_literal_value(item.value)
-                break
     init_assignments = []
-    if node.name == '__init__':
+    last = node.body[-1] if node.body else None
+    if isinstance(last, ast.Return) and last.value and node.name != '__init__':
+        last_return = last  # Common case: the function ends with its return, no scan needed
+    else:
+        # Single pass collecting the last valued return and, for __init__, the self.x assignments
+        last_return = None
+        is_init = node.name == '__init__'
         for item in node.body:
-            if isinstance(item, ast.Assign):
+            if isinstance(item, ast.Return):
+                if item.value: last_return = item
+            elif is_init and isinstance(item, ast.Assign):
                 for target in item.targets:
                     if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == 'self':
-                        init_assignments.append(ast.unparse(item))
-    return {
-        "name": node.name,
-        "args": ast.unparse(node.args),
-        "decorators": [ast.unparse(d) for d in node.decorator_list],
-        "returns_hint": ast.unparse(node.returns) if node.returns else None,
-        "return_expression": return_expression_str,
-        "return_literal_obj": return_literal_obj,
-        "docstring": ast.get_docstring(node, clean=False),
-        "init_assignments": init_assignments
-    }
-
-def parse_class(node: ast.ClassDef) -> Dict[str, Any]:
-    """Parses a ClassDef node into a rich dictionary."""
-    return {
-        "name": node.name,
-        "bases": [ast.unparse(b) for b in node.bases],
-        "decorators": [ast.unparse(d) for d in node.decorator_list],
-        "docstring": ast.get_docstring(node, clean=False),
-        "methods": [parse_function(item) for item in node.body if isinstance(item, ast.FunctionDef)],
-        "variables": {target.id: get_node_repr(item.value) for item in node.body if isinstance(item, ast.Assign) for target in item.targets if isinstance(target, ast.Name)}
-    }
-
-def _prune_context(full_context: Dict[str, Any], imported_names: Set[str], mode: str) -> Dict[str, Any]:
+                        init_assignments.append(_src(item, source_lines))
+    if last_return is not None:
+        return_expression_str = get_node_repr(last_return.value, source_lines)
+        if type(last_return.value).__name__ in _LITERAL_NODES:
+            return_literal_obj = _get_literal_value(last_return.value)
+    return FuncInfo(
+        name=node.name,
+        args=_format_args(node.args, source_lines),
+        decorators=[_src(d, source_lines) for d in node.decorator_list],
+        returns_hint=_src(node.returns, source_lines) if node.returns else None,
+        return_expression=return_expression_str,
+        return_literal_obj=return_literal_obj,
+        docstring=_docstring(node),
+        init_assignments=init_assignments,
+    )
+
+class ClassInfo:
+    """A parsed class. A plain __slots__ class, as importing dataclasses would pull in inspect (and ast) at startup."""
+    __slots__ = ("name", "bases", "decorators", "docstring", "methods", "variables")
+
+    def __init__(self, name: str, bases: List[str], decorators: List[str], docstring: str | None,
+                 methods: List[FuncInfo], variables: Dict[str, str]):
+        self.name = name
+        self.bases = bases
+        self.decorators = decorators
+        self.docstring = docstring
+        self.methods = methods
+        self.variables = variables
+
+    def _asdict(self) -> Dict[str, Any]:
+        return {"name": self.name, "bases": self.bases, "decorators": self.decorators, "docstring": self.docstring,
+                "methods": [m._asdict() for m in self.methods], "variables": self.variables}
+
+    @classmethod
+    def _fromdict(cls, d: Dict[str, Any]) -> ClassInfo:
+        return cls(d["name"], d["bases"], d["decorators"], d["docstring"], [FuncInfo._fromdict(m) for m in d["methods"]], d["variables"])
+
+def parse_class(node: ast.ClassDef, source_lines: List[str] | None = None) -> ClassInfo:
+    """Parses a ClassDef node into a ClassInfo."""
+    _import_ast()
+    return ClassInfo(
+        name=node.name,
+        bases=[_src(b, source_lines) for b in node.bases],
+        decorators=[_src(d, source_lines) for d in node.decorator_list],
+        docstring=_docstring(node),
+        methods=[parse_function(item, source_lines) for item in node.body if isinstance(item, ast.FunctionDef)],
+        variables={target.id: get_node_repr(item.value, source_lines) for item in node.body if isinstance(item, ast.Assign) for target in item.targets if isinstance(target, ast.Name)},
+    )
+
+def _index_definitions(definitions: Dict[str, Any]):
+    """Adds name -> definition side tables so pruning by imported names is a direct lookup."""
+    definitions["_fn_by_name"] = {f.name: f for f in definitions["functions"]}
+    definitions["_cls_by_name"] = {c.name: c for c in definitions["classes"]}
+
+def _prune_context(full_context: Dict[str, Any], imported_names: List[str], mode: str) -> Dict[str, Any]:
     """Filters the context of an imported file based on the selected parsing mode."""
     if mode == 'full':
         return full_context
@@ -74,137 +288,320 @@ def _prune_context(full_context: Dict[str, Any], imported_names: Set[str], mode:
     pruned = {"module_name": full_context.get("module_name"), "imports": [], "variables": {}, "functions": [], "classes": []}
     
     if mode == 'intelligent':
-        pruned["variables"] = {k: v for k, v in full_context.get("variables", {}).items() if not k.startswith('_')}
-        pruned["functions"] = [f for f in full_context.get("functions", []) if not f['name'].startswith('_')]
-        pruned["classes"] = [c for c in full_context.get("classes", []) if not c['name'].startswith('_')]
+        _sw = str.startswith
+        pruned["variables"] = {k: v for k, v in full_context.get("variables", {}).items() if not _sw(k, '_')}
+        pruned["functions"] = [f for f in full_context.get("functions", []) if not _sw(f.name, '_')]
+        pruned["classes"] = [c for c in full_context.get("classes", []) if not _sw(c.name, '_')]
     elif mode == 'pruned':
-        pruned["variables"] = {k: v for k, v in full_context.get("variables", {}).items() if k in imported_names}
-        pruned["functions"] = [f for f in full_context.get("functions", []) if f['name'] in imported_names]
-        pruned["classes"] = [c for c in full_context.get("classes", []) if c['name'] in imported_names]
+        var_map = full_context.get("variables", {})
+        fn_map = full_context.get("_fn_by_name", {})
+        cls_map = full_context.get("_cls_by_name", {})
+        names = dict.fromkeys(imported_names)  # de-duplicated, import order preserved
+        pruned["variables"] = {n: var_map[n] for n in names if n in var_map}
+        pruned["functions"] = [fn_map[n] for n in names if n in fn_map]
+        pruned["classes"] = [cls_map[n] for n in names if n in cls_map]
         
     return pruned
 
-def _extract_definitions_from_tree(tree: ast.Module, base_path: str, definitions: Dict[str, Any], mode: str):
+def _handle_assign(node: ast.Assign, definitions: Dict[str, Any], source_lines: List[str] | None):
+    value = get_node_repr(node.value, source_lines)
+    for target in node.targets:
+        if isinstance(target, ast.Name): definitions["variables"][target.id] = value
+
+def _handle_funcdef(node: ast.FunctionDef, definitions: Dict[str, Any], source_lines: List[str] | None):
+    definitions["functions"].append(parse_function(node, source_lines))
+
+def _handle_classdef(node: ast.ClassDef, definitions: Dict[str, Any], source_lines: List[str] | None):
+    definitions["classes"].append(parse_class(node, source_lines))
+
+def _handle_import(node: ast.Import, definitions: Dict[str, Any], source_lines: List[str] | None):
+    definitions["imports"].append({"import": _src(node, source_lines), "module": None, "module_path": None, "names": [], "resolved_context": None})
+
+def _handle_import_from(node: ast.ImportFrom, definitions: Dict[str, Any], source_lines: List[str] | None):
+    import_data = {"import": _src(node, source_lines), "module": None, "module_path": None, "names": [], "resolved_context": None}
+    if node.module:
+        import_data["module"] = node.module
+        import_data["names"] = [alias.name for alias in node.names]
+    definitions["imports"].append(import_data)
+
+# Top-level statement handlers keyed by exact node class name (parser output is never subclassed)
+_HANDLERS = {
+    "Assign": _handle_assign,
+    "FunctionDef": _handle_funcdef,
+    "ClassDef": _handle_classdef,
+    "Import": _handle_import,
+    "ImportFrom": _handle_import_from,
+}
+
+def _extract_definitions_from_tree(tree: ast.Module, base_path: str, definitions: Dict[str, Any], mode: str, source_lines: List[str] | None = None):
     """Helper to walk the AST and populate the definitions dictionary."""
     for node in tree.body:
-        if isinstance(node, ast.Assign):
-            value = get_node_repr(node.value)
-            for target in node.targets:
-                if isinstance(target, ast.Name): definitions["variables"][target.id] = value
-        elif isinstance(node, ast.FunctionDef):
-            definitions["functions"].append(parse_function(node))
-        elif isinstance(node, ast.ClassDef):
-            definitions["classes"].append(parse_class(node))
-        elif isinstance(node, (ast.Import, ast.ImportFrom)):
-            import_data = {"import": ast.unparse(node), "module": None, "resolved_context": None}
-            if isinstance(node, ast.ImportFrom) and node.module:
-                import_data["module"] = node.module
-                relative_module_path = node.module.replace('.', os.sep) + '.py'
-                module_path = os.path.join(base_path, relative_module_path)
-                
-                full_resolved_context = parse_file(module_path, mode)
-                
-                if full_resolved_context:
-                    imported_names = {alias.name for alias in node.names}
-                    pruned_context = _prune_context(full_resolved_context, imported_names, mode)
-                    import_data["resolved_context"] = pruned_context
-            definitions["imports"].append(import_data)
-
-def parse_file(filepath: str, mode: str = 'intelligent', content: str = None) -> Dict[str, Any] | None:
-    """Parses Python code from a string, with fault tolerance."""
+        handler = _HANDLERS.get(type(node).__name__)
+        if handler: handler(node, definitions, source_lines)
+
+# Below this many imported files a process pool costs more than it saves
+PARALLEL_MIN_IMPORTS = 4
+
+def _module_path(import_data: Dict[str, Any], base_path: str) -> str:
+    """Returns the file path a `from x import y` statement resolves to."""
+    return os.path.join(base_path, import_data["module"].replace('.', os.sep) + '.py')
+
+def _reset_worker_caches():
+    """Process pool initializer: forked workers must not reuse the parent's SQLite connection."""
+    global _cache_db
+    _cache_db = None
+    parse_cache.clear()
+    dir_listing_cache.clear()
+
+def _missing_from_disk_cache(module_paths: List[str]) -> List[str]:
+    """Returns the files whose current content has no row in the on-disk cache (all of them if it is unavailable)."""
+    db = _open_cache_db()
+    if db is None: return module_paths
+    import hashlib
+    import sqlite3
+    missing = []
+    for module_path in module_paths:
+        try:
+            with open(module_path, "rb") as f: sha = hashlib.sha256(f.read()).digest()
+            if not db.execute("SELECT 1 FROM ast WHERE path = ? AND sha = ? AND pyver = ?", (os.path.abspath(module_path), sha, CACHE_PYVER)).fetchone():
+                missing.append(module_path)
+        except (OSError, sqlite3.Error):
+            missing.append(module_path)
+    return missing
+
+def _parse_files_in_parallel(module_paths: List[str], mode: str) -> Dict[str, Dict[str, Any] | None]:
+    """
+    Parses the files that miss the disk cache in a process pool. Returns {} when that is not worthwhile
+    (single CPU, too few misses) or on failure; whatever is not returned is parsed sequentially by the caller.
+    """
+    cpu_count = os.cpu_count() or 1
+    if cpu_count <= 1: return {}
+    module_paths = [p for p in dict.fromkeys(module_paths) if _file_exists(p)]
+    if len(module_paths) < PARALLEL_MIN_IMPORTS: return {}
+    # Cache hits are cheaper in-process than the cost of starting a worker
+    module_paths = _missing_from_disk_cache(module_paths)
+    if len(module_paths) < PARALLEL_MIN_IMPORTS: return {}
+    from concurrent.futures import ProcessPoolExecutor
+    try:
+        with ProcessPoolExecutor(max_workers=min(len(module_paths), cpu_count), initializer=_reset_worker_caches) as pool:
+            return dict(zip(module_paths, pool.map(parse_file, module_paths, [mode] * len(module_paths))))
+    except Exception as e:
+        print(f"Parallel import parsing failed, parsing sequentially: {e}", file=sys.stderr)
+        return {}
+
+def _resolve_imports(definitions: Dict[str, Any], base_path: str, mode: str, parallel: bool = False):
+    """
+    Parses the files behind `from x import y` statements and attaches their pruned context.
+    With `parallel`, the imported files are parsed in worker processes (their own imports are resolved sequentially there).
+    """
+    module_imports = [import_data for import_data in definitions["imports"] if import_data["module"]]
+    parsed = _parse_files_in_parallel([_module_path(i, base_path) for i in module_imports], mode) if parallel else {}
+    for import_data in module_imports:
+        module_path = import_data["module_path"] = _module_path(import_data, base_path)
+
+        full_resolved_context = parsed[module_path] if module_path in parsed else _parse_file(module_path, mode, None, False, True)
+
+        if full_resolved_context:
+            pruned_context = _prune_context(full_resolved_context, import_data["names"], mode)
+            import_data["resolved_context"] = pruned_context
+
+# Lines at column 0 that begin a new top-level block for fault-tolerant reparsing
+_BLOCK_STARTS = ("def ", "async def ", "class ", "@", "import ", "from ")
+
+def _bracket_balance(line: str) -> int:
+    """Returns opened minus closed brackets on a line, ignoring a trailing comment (strings are not special-cased)."""
+    code = line.split("#", 1)[0]
+    return sum(code.count(c) for c in "([{") - sum(code.count(c) for c in ")]}")
+
+def _parse_lines(lines: List[str], filename: str) -> ast.Module:
+    return ast.parse("".join(lines), filename=filename, type_comments=False, feature_version=PARSE_FEATURE_VERSION)
+
+def _parse_without_error_line(lines: List[str], filename: str, error: SyntaxError) -> ast.Module:
+    """
+    Reparses after blanking the line a SyntaxError points at (typically the half-typed line in the editor).
+    The line is replaced rather than deleted so every other node keeps its line number. If a blank line
+    leaves an empty body behind, a `pass` at the same indentation is tried instead.
+    """
+    lineno = error.lineno
+    if not lineno or not 1 <= lineno <= len(lines): raise error
+    bad_line = lines[lineno - 1]
+    indent = bad_line[:len(bad_line) - len(bad_line.lstrip(" \t"))]
+    try:
+        return _parse_lines(lines[:lineno - 1] + ["\n"] + lines[lineno:], filename)
+    except SyntaxError:
+        return _parse_lines(lines[:lineno - 1] + [f"{indent}pass\n"] + lines[lineno:], filename)
+
+def _parse_top_level_blocks(source_lines: List[str], filename: str) -> Tuple[ast.Module, int, SyntaxError | None]:
+    """
+    Parses a file that failed to parse as a whole, one top-level block at a time.
+    Blocks start at unindented def/class/decorator/import lines. A failing block is retried
+    without its error line, and dropped only if it still fails.
+    Returns the merged module (with line numbers relative to the whole file), the number of skipped blocks and the last error.
+    """
+    # A decorator stays attached to what follows it, across comment lines and its own continuation lines
+    starts, after_decorator, open_brackets = [0], False, 0
+    for i, line in enumerate(source_lines):
+        if i and line.startswith(_BLOCK_STARTS) and not after_decorator: starts.append(i)
+        if open_brackets or line.startswith("@"):
+            after_decorator, open_brackets = True, max(0, open_brackets + _bracket_balance(line))
+        elif line.strip() and not line.lstrip().startswith("#"):
+            after_decorator = False
+    starts.append(len(source_lines))
+
+    body, skipped, last_error = [], 0, None
+    for start, end in zip(starts, starts[1:]):
+        block_lines = source_lines[start:end]
+        try:
+            block = _parse_lines(block_lines, filename)
+        except SyntaxError as e:
+            try:
+                block = _parse_without_error_line(block_lines, filename, e)
+            except SyntaxError as retry_error:
+                skipped, last_error = skipped + 1, retry_error
+                continue
+        ast.increment_lineno(block, start)
+        body.extend(block.body)
+    return ast.Module(body=body, type_ignores=[]), skipped, last_error
+
+def parse_file(filepath: str, mode: str = 'intelligent', content: str | bytes = None, parallel_imports: bool = False,
+               resolve_imports: bool = True) -> Dict[str, Any] | None:
+    """
+    Parses Python code from a string, with fault tolerance. `parallel_imports` fans out its direct imports to processes.
+    `content` may be UTF-8 bytes, which are hashed and parsed without a re-encode; otherwise the file is read from disk.
+    With `resolve_imports=False` imported files are not parsed at all and every `resolved_context` stays None.
+    """
+    # Directory listings are only trusted within one call, so long-lived hosts see created and deleted modules
+    dir_listing_cache.clear()
+    return _parse_file(filepath, mode, content, parallel_imports, resolve_imports)
+
+def _parse_file(filepath: str, mode: str, content: str | bytes | None, parallel_imports: bool, resolve_imports: bool) -> Dict[str, Any] | None:
+    """parse_file without the per-call reset; imported files are parsed recursively through this."""
+    _import_ast()
+    import hashlib
     abs_filepath = os.path.abspath(filepath)
-    if abs_filepath in parse_cache: return parse_cache[abs_filepath]
-    
     base_path = os.path.dirname(abs_filepath)
-    definitions = {"imports": [], "variables": {}, "functions": [], "classes": [], "module_name": os.path.basename(abs_filepath)}
+    # Only files read from disk are stored; caller-supplied (unsaved) buffers change on every keystroke
+    from_disk = content is None
     
     if content is None:
-        if not os.path.exists(abs_filepath): return None
-        with open(abs_filepath, "r", encoding="utf-8") as f: content = f.read()
+        if not _file_exists(abs_filepath): return None
+        try:
+            with open(abs_filepath, "rb") as f: content = f.read()
+        except OSError:
+            # The listing was stale (file removed or unreadable since the scan); rescan on the next lookup
+            dir_listing_cache.pop(base_path, None)
+            return None
+    content_bytes = content if isinstance(content, bytes) else content.encode("utf-8")
+
+    sha = hashlib.sha256(content_bytes).digest()
+    cache_key = (abs_filepath, sha, mode if resolve_imports else None)
+    if cache_key in parse_cache:
+        parse_cache.move_to_end(cache_key)
+        return parse_cache[cache_key]
 
+    definitions = _load_cached_definitions(abs_filepath, sha)
+    if definitions is not None:
+        definitions["_content_sha"] = sha
+        # Cache before resolving so circular imports get this (partial) dict back instead of recursing
+        _remember_parse(cache_key, definitions)
+        if resolve_imports: _resolve_imports(definitions, base_path, mode, parallel_imports)
+        return definitions
+
+    definitions = {"imports": [], "variables": {}, "functions": [], "classes": [], "module_name": os.path.basename(abs_filepath)}
+    source_lines = split_source_lines(content_bytes.decode("utf-8-sig"))
     try:
-        tree = ast.parse(content, filename=abs_filepath)
-        _extract_definitions_from_tree(tree, base_path, definitions, mode)
+        tree = ast.parse(content_bytes, filename=abs_filepath, type_comments=False, feature_version=PARSE_FEATURE_VERSION)
     except SyntaxError as e:
         print(f"Handled SyntaxError on line {e.lineno}. Reparsing without it.", file=sys.stderr)
         try:
-            lines = content.splitlines()
-            if 1 <= e.lineno <= len(lines): del lines[e.lineno - 1]
-            resilient_content = "\n".join(lines)
-            tree = ast.parse(resilient_content, filename=abs_filepath)
-            _extract_definitions_from_tree(tree, base_path, definitions, mode)
-        except Exception as final_e:
-            definitions["error"] = f"File contains multiple errors. Last error: {final_e}"
+            tree = _parse_without_error_line(source_lines, abs_filepath, e)
+        except SyntaxError:
+            print("File still has syntax errors. Reparsing top-level blocks independently.", file=sys.stderr)
+            tree, skipped, last_error = _parse_top_level_blocks(source_lines, abs_filepath)
+            if skipped: print(f"Skipped {skipped} top-level block(s) with syntax errors.", file=sys.stderr)
+            if not tree.body:
+                definitions["error"] = f"File contains no parsable blocks. Last error: {last_error}"
+    if "error" not in definitions:
+        _extract_definitions_from_tree(tree, base_path, definitions, mode, source_lines)
     
-    parse_cache[abs_filepath] = definitions
+    _index_definitions(definitions)
+    definitions["_content_sha"] = sha
+    if from_disk: _store_cached_definitions(abs_filepath, sha, definitions)
+    _remember_parse(cache_key, definitions)
+    if resolve_imports: _resolve_imports(definitions, base_path, mode, parallel_imports)
     return definitions
 
+_TYPE_TO_HINT = {str: " -> str", bool: " -> bool", int: " -> int", list: " -> list", dict: " -> dict"}
+
+def _hint_for_literal(val: Any) -> str:
+    """Returns the return-type hint for a literal value. Exact type match, so True maps to bool, not int."""
+    return _TYPE_TO_HINT.get(type(val), "")
+
+# One render per function/method; every field carries its own newlines (or is empty)
+_FUNC_TMPL = "{decorators}def {name}({args}){ret}:\n{doc}    # some code lines\n{ret_line}\n"
+_METH_TMPL = "{decorators}    def {name}({args}){ret}:\n{doc}{body}        # some code lines\n{ret_line}\n"
+
 def format_context_as_text(context_dict: Dict[str, Any]) -> str:
     """Takes a parsed context dictionary and formats it into readable text."""
     if not context_dict or context_dict.get("error"): return context_dict.get("error", "Error: Could not format context.")
-    lines = [context_dict.get("module_name", "Unknown File"), "=" * len(context_dict.get("module_name", "Unknown File"))]
+    # Every line is written with its own newline; the final one is dropped on return
+    buf = io.StringIO()
+    w = buf.write
+    module_name = context_dict.get("module_name", "Unknown File")
+    w(f"{module_name}\n{'=' * len(module_name)}\n")
     if context_dict.get("imports"):
-        for imp in context_dict["imports"]: lines.append(imp["import"])
-        lines.append("")
+        for imp in context_dict["imports"]: w(f"{imp['import']}\n")
+        w("\n")
     if context_dict.get("variables"):
-        for name, value in context_dict["variables"].items(): lines.append(f"{name} = {value}")
-        lines.append("")
+        for name, value in context_dict["variables"].items(): w(f"{name} = {value}\n")
+        w("\n")
 
     for func in context_dict.get("functions", []):
-        lines.extend([f"@{d}" for d in func['decorators']])
         return_type_str = ""
-        if func['returns_hint']:
-            return_type_str = f" -> {func['returns_hint']}"
-        elif func['return_expression'] is None:
+        if func.returns_hint:
+            return_type_str = f" -> {func.returns_hint}"
+        elif func.return_expression is None:
             return_type_str = " -> None"
-        elif func['return_literal_obj'] is not None:
-            val = func['return_literal_obj']
-            if isinstance(val, str): return_type_str = " -> str"
-            elif isinstance(val, int): return_type_str = " -> int"
-            elif isinstance(val, bool): return_type_str = " -> bool"
-            elif isinstance(val, list): return_type_str = " -> list"
-            elif isinstance(val, dict): return_type_str = " -> dict"
-        lines.append(f"def {func['name']}({func['args']}){return_type_str}:")
-        if func['docstring']: lines.append(f"    \"\"\"{func['docstring']}\"\"\"")
-        lines.append("    # some code lines")
-        if func['return_expression'] is not None:
-            lines.append(f"    return {func['return_expression']}")
-        lines.append("")
+        elif func.return_literal_obj is not None:
+            return_type_str = _hint_for_literal(func.return_literal_obj)
+        w(_FUNC_TMPL.format_map({
+            "decorators": "".join(f"@{d}\n" for d in func.decorators),
+            "name": func.name,
+            "args": func.args,
+            "ret": return_type_str,
+            "doc": f"    \"\"\"{func.docstring}\"\"\"\n" if func.docstring else "",
+            "ret_line": f"    return {func.return_expression}\n" if func.return_expression is not None else "",
+        }))
 
     for cls in context_dict.get("classes", []):
-        lines.extend([f"@{d}" for d in cls['decorators']])
-        base_classes = f"({', '.join(cls['bases'])})" if cls['bases'] else ""
-        lines.append(f"class {cls['name']}{base_classes}:")
-        if cls['docstring']: lines.append(f"    \"\"\"{cls['docstring']}\"\"\"")
-        lines.append("")
-        for name, value in cls['variables'].items(): lines.append(f"    {name} = {value}")
-        if cls['variables']: lines.append("")
-        for meth in cls["methods"]:
-            lines.extend([f"    @{d}" for d in meth['decorators']])
+        for d in cls.decorators: w(f"@{d}\n")
+        base_classes = f"({', '.join(cls.bases)})" if cls.bases else ""
+        w(f"class {cls.name}{base_classes}:\n")
+        if cls.docstring: w(f"    \"\"\"{cls.docstring}\"\"\"\n")
+        w("\n")
+        for name, value in cls.variables.items(): w(f"    {name} = {value}\n")
+        if cls.variables: w("\n")
+        for meth in cls.methods:
             meth_return_type_str = ""
-            if meth['returns_hint']:
-                meth_return_type_str = f" -> {meth['returns_hint']}"
-            elif meth['name'] == '__init__' or meth['return_expression'] is None:
+            if meth.returns_hint:
+                meth_return_type_str = f" -> {meth.returns_hint}"
+            elif meth.name == '__init__' or meth.return_expression is None:
                 meth_return_type_str = " -> None"
-            elif meth['return_literal_obj'] is not None:
-                val = meth['return_literal_obj']
-                if isinstance(val, str): meth_return_type_str = " -> str"
-                elif isinstance(val, int): meth_return_type_str = " -> int"
-                elif isinstance(val, bool): meth_return_type_str = " -> bool"
-                elif isinstance(val, list): meth_return_type_str = " -> list"
-                elif isinstance(val, dict): meth_return_type_str = " -> dict"
-            lines.append(f"    def {meth['name']}({meth['args']}){meth_return_type_str}:")
-            if meth['docstring']: lines.append(f"        \"\"\"{meth['docstring']}\"\"\"")
-            if meth.get('init_assignments'):
-                for assign_line in meth['init_assignments']:
-                    lines.append(f"        {assign_line}")
-            lines.append("        # some code lines")
-            if meth['return_expression'] is not None:
-                if meth['name'] != '__init__' or not meth.get('init_assignments'):
-                     lines.append(f"        return {meth['return_expression']}")
-            lines.append("")
-        lines.append("")
-    return "\n".join(lines)
+            elif meth.return_literal_obj is not None:
+                meth_return_type_str = _hint_for_literal(meth.return_literal_obj)
+            init_assignments = meth.init_assignments
+            show_return = meth.return_expression is not None and (meth.name != '__init__' or not init_assignments)
+            w(_METH_TMPL.format_map({
+                "decorators": "".join(f"    @{d}\n" for d in meth.decorators),
+                "name": meth.name,
+                "args": meth.args,
+                "ret": meth_return_type_str,
+                "doc": f"        \"\"\"{meth.docstring}\"\"\"\n" if meth.docstring else "",
+                "body": "".join(f"        {assign_line}\n" for assign_line in init_assignments or ()),
+                "ret_line": f"        return {meth.return_expression}\n" if show_return else "",
+            }))
+        w("\n")
+    return buf.getvalue()[:-1]
 
 if __name__ == "__main__":
     print("Python parser process started.", file=sys.stderr)
@@ -212,22 +609,26 @@ if __name__ == "__main__":
         file_to_parse_path = sys.argv[1]
         parsing_mode = sys.argv[2].lower() if len(sys.argv) > 2 else 'intelligent'
         if parsing_mode not in ['pruned', 'intelligent', 'full']: parsing_mode = 'intelligent'
+        resolve_imports = sys.argv[3].lower() not in ['false', '0', 'no'] if len(sys.argv) > 3 else True
         
-        code_content = sys.stdin.read()
+        code_content = sys.stdin.buffer.read()
 
         print(f"Running in '{parsing_mode}' mode on content of '{os.path.basename(file_to_parse_path)}'.", file=sys.stderr)
         parse_cache.clear()
         
-        main_context = parse_file(file_to_parse_path, parsing_mode, code_content)
+        main_context = parse_file(file_to_parse_path, parsing_mode, code_content, parallel_imports=True, resolve_imports=resolve_imports)
         
         if main_context:
             if "error" in main_context: print(f"Error parsing file: {main_context['error']}")
             else:
                 final_output = [format_context_as_text(main_context)]
-                imported_files_text, formatted_imports = [], set()
+                imported_files_text, formatted_files = [], set()
                 for imp in main_context.get("imports", []):
-                    if imp.get("resolved_context") and imp.get("module") not in formatted_imports:
-                        formatted_imports.add(imp["module"])
+                    if not imp.get("resolved_context"): continue
+                    # Dedup on the physical file, so differently spelled imports of one module are formatted once
+                    real_module_path = os.path.realpath(imp["module_path"])
+                    if real_module_path not in formatted_files:
+                        formatted_files.add(real_module_path)
                         imported_files_text.append(format_context_as_text(imp["resolved_context"]))
                 if imported_files_text:
                     final_output.extend(["\nImported files content", "======================"])